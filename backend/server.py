@@ -1,17 +1,23 @@
-from fastapi import FastAPI, APIRouter, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from fastapi.websockets import WebSocketState
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Set, Tuple, Union
 import uuid
-from datetime import datetime
-import json
+from datetime import datetime, timezone
+import orjson
 import asyncio
+import contextlib
+import time
+from collections import defaultdict
 
 
 ROOT_DIR = Path(__file__).parent
@@ -19,11 +25,93 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    tz_aware=True,
+    # Sized for bursts of short chat operations; tune per deployment
+    maxPoolSize=int(os.environ.get('MONGO_MAX_POOL_SIZE', '200')),
+    minPoolSize=int(os.environ.get('MONGO_MIN_POOL_SIZE', '20')),
+    serverSelectionTimeoutMS=int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '2000')),
+    compressors=os.environ.get('MONGO_COMPRESSORS') or None,
+)
 db = client[os.environ['DB_NAME']]
 
+# Chat messages are buffered in memory and written to MongoDB in batches
+MESSAGE_FLUSH_INTERVAL = float(os.environ.get('MESSAGE_FLUSH_INTERVAL', '1.0'))
+# Default and maximum page size for a session's message history
+MESSAGE_HISTORY_LIMIT = 100
+MESSAGE_HISTORY_MAX_LIMIT = 500
+pending_messages: Dict[str, List[Dict]] = defaultdict(list)
+# Messages taken from pending_messages by the flush currently writing them
+inflight_messages: Dict[str, List[Dict]] = {}
+flush_lock = asyncio.Lock()
+# Past this many unwritten messages (e.g. during a database outage) new messages get a 503
+MAX_PENDING_MESSAGES = int(os.environ.get('MAX_PENDING_MESSAGES', '10000'))
+
+def unwritten_message_count() -> int:
+    return sum(map(len, pending_messages.values())) + sum(map(len, inflight_messages.values()))
+
+# Short-lived look-aside cache for user and session reads, invalidated on writes
+USER_CACHE_TTL = 60
+SESSION_CACHE_TTL = 30
+READ_CACHE_MAX_ENTRIES = 10000
+read_cache: Dict[str, Tuple[float, Dict]] = {}
+# Bumped on every invalidation so reads that overlapped one don't cache what they saw
+cache_generation = 0
+
+def cache_get(key: str) -> Optional[Dict]:
+    entry = read_cache.get(key)
+    if entry is None:
+        return None
+    if entry[0] < time.monotonic():
+        del read_cache[key]
+        return None
+    return entry[1]
+
+def cache_token() -> int:
+    # Take before reading from the database and pass to cache_set
+    return cache_generation
+
+def cache_set(key: str, value: Dict, ttl: float, token: int):
+    if token != cache_generation:
+        return
+    now = time.monotonic()
+    if len(read_cache) >= READ_CACHE_MAX_ENTRIES:
+        for stale_key in [k for k, (expires, _) in read_cache.items() if expires < now]:
+            del read_cache[stale_key]
+        if len(read_cache) >= READ_CACHE_MAX_ENTRIES:
+            read_cache.clear()
+    read_cache[key] = (now + ttl, value)
+
+def cache_delete(*keys: str):
+    global cache_generation
+    cache_generation += 1
+    for key in keys:
+        read_cache.pop(key, None)
+
+# Only the fields needed to route messages within a session
+PARTICIPANTS_PROJECTION = {"_id": 0, "candidate_id": 1, "hr_id": 1}
+
+# Largest WebSocket frame accepted from clients (characters for text frames);
+# run uvicorn with a matching --ws-max-size to reject larger frames before they are buffered
+MAX_FRAME_SIZE = 64 * 1024
+
+# Maximum frames per connection waiting to be forwarded before reads pause
+MAX_PENDING_FORWARDS = 64
+
+# Constant WebSocket replies, serialised once
+PONG = orjson.dumps({"type": "pong"}).decode()
+
+class APIJSONResponse(ORJSONResponse):
+    # Write UTC datetimes with a "Z" suffix, as pydantic does for the same models
+    def render(self, content) -> bytes:
+        return orjson.dumps(
+            content,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_UTC_Z,
+        )
+
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=APIJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -32,60 +120,163 @@ api_router = APIRouter(prefix="/api")
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
+        # session_id -> (candidate_id, hr_id), kept in sync by the session endpoints
+        self.session_participants: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        # user_id -> session_id, and session_id -> sockets of its connected participants.
+        # Entries only live while a participant is connected; idle sessions are reloaded
+        # from the database by get_session_participants on demand
+        self.user_sessions: Dict[str, str] = {}
+        self.session_sockets: Dict[str, Set[WebSocket]] = {}
         
     async def connect(self, websocket: WebSocket, user_id: str):
         await websocket.accept()
+        previous = self.active_connections.get(user_id)
         self.active_connections[user_id] = websocket
+        session_id = self.user_sessions.get(user_id)
+        if session_id and user_id in self.session_participants.get(session_id, ()):
+            sockets = self.session_sockets.setdefault(session_id, set())
+            sockets.discard(previous)
+            sockets.add(websocket)
         
-    def disconnect(self, user_id: str):
+    def disconnect(self, user_id: str, websocket: Optional[WebSocket] = None):
+        # A stale connection closing must not drop the user's newer one
+        if websocket is not None and self.active_connections.get(user_id) is not websocket:
+            return
+        self._unbind_socket(user_id)
         if user_id in self.active_connections:
             del self.active_connections[user_id]
+
+    def _unbind_socket(self, user_id: str):
+        websocket = self.active_connections.get(user_id)
+        session_id = self.user_sessions.get(user_id)
+        if websocket and session_id in self.session_sockets:
+            self.session_sockets[session_id].discard(websocket)
+            self._release_if_idle(session_id)
+
+    def _release_if_idle(self, session_id: str):
+        # Drop all state for a session once none of its participants is connected
+        if self.session_sockets.get(session_id):
+            return
+        self.session_sockets.pop(session_id, None)
+        for user_id in self.session_participants.pop(session_id, ()):
+            if user_id and self.user_sessions.get(user_id) == session_id:
+                del self.user_sessions[user_id]
             
     async def send_personal_message(self, message: str, user_id: str):
         if user_id in self.active_connections:
             websocket = self.active_connections[user_id]
             if websocket.client_state == WebSocketState.CONNECTED:
                 await websocket.send_text(message)
+
+    def bind_to_session(self, user_id: str, session_id: str):
+        if self.user_sessions.get(user_id) != session_id:
+            self._unbind_socket(user_id)
+        self.user_sessions[user_id] = session_id
+        if user_id in self.active_connections:
+            self.session_sockets.setdefault(session_id, set()).add(self.active_connections[user_id])
                 
+    def set_session_participants(self, session_id: str, candidate_id: Optional[str], hr_id: Optional[str]):
+        participants = (candidate_id, hr_id)
+        # Forget replaced participants so reconnecting doesn't bind them to the session again
+        for user_id in self.session_participants.get(session_id, ()):
+            if user_id and user_id not in participants and self.user_sessions.get(user_id) == session_id:
+                del self.user_sessions[user_id]
+        self.session_participants[session_id] = participants
+        # Rebuild the socket set so replaced participants stop receiving messages
+        self.session_sockets[session_id] = set()
+        for participant_id in participants:
+            if participant_id:
+                self.bind_to_session(participant_id, session_id)
+        self._release_if_idle(session_id)
+
+    async def get_session_participants(self, session_id: str) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        # Only fall back to the database for sessions this process hasn't seen yet
+        participants = self.session_participants.get(session_id)
+        if participants is None:
+            session = await db.interview_sessions.find_one(
+                {"session_id": session_id}, PARTICIPANTS_PROJECTION
+            )
+            if not session:
+                return None
+            participants = (session.get("candidate_id"), session.get("hr_id"))
+            self.set_session_participants(session_id, *participants)
+        return participants
+
     async def send_to_session(self, message: dict, session_id: str):
-        # Send message to all participants in a session
-        session = await db.interview_sessions.find_one({"session_id": session_id})
-        if session:
-            for participant_id in [session.get("candidate_id"), session.get("hr_id")]:
-                if participant_id and participant_id in self.active_connections:
-                    websocket = self.active_connections[participant_id]
-                    if websocket.client_state == WebSocketState.CONNECTED:
-                        await websocket.send_text(json.dumps(message))
+        # Serialise once and reuse the payload for every recipient
+        await self.forward_raw(orjson.dumps(message).decode(), session_id)
+
+    async def forward_raw(self, payload: Union[str, bytes], session_id: str):
+        # Send an already-encoded frame to all participants in a session
+        if session_id not in self.session_participants:
+            await self.get_session_participants(session_id)
+        sockets = [
+            websocket for websocket in self.session_sockets.get(session_id, ())
+            if websocket.client_state == WebSocketState.CONNECTED
+        ]
+        # Send to everyone concurrently so one slow client doesn't hold up the rest
+        results = await asyncio.gather(
+            *(self._send(websocket, payload) for websocket in sockets),
+            return_exceptions=True
+        )
+        for websocket, result in zip(sockets, results):
+            if isinstance(result, Exception):
+                self.disconnect_socket(websocket)
+
+    @staticmethod
+    async def _send(websocket: WebSocket, payload: Union[str, bytes]):
+        if isinstance(payload, bytes):
+            await websocket.send_bytes(payload)
+        else:
+            await websocket.send_text(payload)
+
+    def disconnect_socket(self, websocket: WebSocket):
+        for user_id, connection in list(self.active_connections.items()):
+            if connection is websocket:
+                self.disconnect(user_id, websocket)
 
 manager = ConnectionManager()
 
 # Define Models
+def new_id() -> str:
+    # Ids double as shareable session links, so they stay unguessable uuid4s
+    return str(uuid.uuid4())
+
+def to_bson_precision(value: datetime) -> datetime:
+    # BSON dates keep milliseconds; truncate up front so values don't change once stored
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+def utc_now() -> datetime:
+    return to_bson_precision(datetime.now(timezone.utc))
+
 class StatusCheck(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     client_name: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=utc_now)
 
 class StatusCheckCreate(BaseModel):
     client_name: str
 
 class User(BaseModel):
-    user_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str = Field(default_factory=new_id)
     name: str
     role: str  # "candidate" or "hr"
     session_id: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=utc_now)
 
 class UserCreate(BaseModel):
     name: str
     role: str
 
 class InterviewSession(BaseModel):
-    session_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    session_id: str = Field(default_factory=new_id)
     candidate_id: Optional[str] = None
     hr_id: Optional[str] = None
     status: str = "waiting"  # waiting, active, completed
     sign_language: str = "ASL"  # American Sign Language by default
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=utc_now)
+
+class InterviewSessionDetail(InterviewSession):
     messages: List[Dict] = []
 
 class SessionCreate(BaseModel):
@@ -97,7 +288,15 @@ class Message(BaseModel):
     sender_role: str
     message_type: str  # "sign_to_text", "text_to_speech", "text_to_sign"
     content: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=utc_now)
+
+def with_defaults(model, document: Dict) -> Dict:
+    # Stored documents omit None fields (exclude_none), so restore the model's defaults
+    defaults = {
+        name: field.default for name, field in model.model_fields.items()
+        if not field.is_required() and field.default_factory is None
+    }
+    return {**defaults, **document}
 
 # Add your routes to the router instead of directly to app
 @api_router.get("/")
@@ -106,86 +305,155 @@ async def root():
 
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
-    status_dict = input.dict()
-    status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
+    status_obj = StatusCheck(client_name=input.client_name)
+    await db.status_checks.insert_one(status_obj.model_dump(exclude_none=True))
     return status_obj
 
-@api_router.get("/status", response_model=List[StatusCheck])
+@api_router.get("/status", responses={200: {"model": List[StatusCheck]}})
 async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+    status_checks = await db.status_checks.find(
+        {}, {"_id": 0, "id": 1, "client_name": 1, "timestamp": 1}
+    ).to_list(1000)
+    # Stored documents were validated on insert, so encode them as-is in one pass
+    return APIJSONResponse(status_checks)
 
 # User management endpoints
 @api_router.post("/users", response_model=User)
 async def create_user(user_data: UserCreate):
-    user_dict = user_data.dict()
-    user_obj = User(**user_dict)
-    await db.users.insert_one(user_obj.dict())
+    user_obj = User(name=user_data.name, role=user_data.role)
+    await db.users.insert_one(user_obj.model_dump(exclude_none=True))
     return user_obj
 
-@api_router.get("/users/{user_id}", response_model=User)
+@api_router.get("/users/{user_id}", responses={200: {"model": User}})
 async def get_user(user_id: str):
-    user = await db.users.find_one({"user_id": user_id})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return User(**user)
+    user = cache_get(f"user:{user_id}")
+    if user is None:
+        token = cache_token()
+        user = await db.users.find_one({"user_id": user_id}, {"_id": 0})
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        cache_set(f"user:{user_id}", user, USER_CACHE_TTL, token)
+    # Stored documents were validated on insert, so encode them as-is
+    return APIJSONResponse(with_defaults(User, user))
 
 # Session management endpoints
 @api_router.post("/sessions", response_model=InterviewSession)
 async def create_session(session_data: SessionCreate):
-    session_dict = session_data.dict()
-    session_obj = InterviewSession(**session_dict)
-    await db.interview_sessions.insert_one(session_obj.dict())
+    session_obj = InterviewSession(sign_language=session_data.sign_language)
+    await db.interview_sessions.insert_one(session_obj.model_dump(exclude_none=True))
+    manager.set_session_participants(session_obj.session_id, session_obj.candidate_id, session_obj.hr_id)
     return session_obj
 
-@api_router.get("/sessions/{session_id}", response_model=InterviewSession)
-async def get_session(session_id: str):
-    session = await db.interview_sessions.find_one({"session_id": session_id})
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
-    return InterviewSession(**session)
+def message_sort_key(message: Dict) -> Tuple[datetime, str]:
+    # History order, and the pagination cursor
+    return (message["timestamp"], message.get("message_id", ""))
+
+@api_router.get("/sessions/{session_id}", responses={200: {"model": InterviewSessionDetail}})
+async def get_session(
+    session_id: str,
+    limit: int = Query(MESSAGE_HISTORY_LIMIT, ge=1, le=MESSAGE_HISTORY_MAX_LIMIT),
+    before: Optional[datetime] = None,
+    before_id: Optional[str] = None,
+):
+    session = cache_get(f"session:{session_id}")
+    if session is None:
+        token = cache_token()
+        session = await db.interview_sessions.find_one(
+            {"session_id": session_id}, {"_id": 0, "messages": 0}
+        )
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        cache_set(f"session:{session_id}", session, SESSION_CACHE_TTL, token)
+    # Copy so attaching messages doesn't modify the cached document
+    session = dict(session)
+    # Page backwards through history: the latest `limit` messages before the
+    # (`before`, `before_id`) cursor, i.e. the oldest message of the previous page
+    query = {"session_id": session_id}
+    # Snapshot unflushed messages before querying, so a flush finishing in between
+    # shows them in the database page instead of dropping them
+    pending = inflight_messages.get(session_id, []) + pending_messages.get(session_id, [])
+    if before is not None:
+        if before.tzinfo is None:
+            before = before.replace(tzinfo=timezone.utc)
+        before = to_bson_precision(before)
+        if before_id is None:
+            query["timestamp"] = {"$lt": before}
+        else:
+            # Messages sharing the cursor's millisecond are ordered by message_id
+            query["$or"] = [
+                {"timestamp": {"$lt": before}},
+                {"timestamp": before, "message_id": {"$lt": before_id}},
+            ]
+        cursor = (before, before_id if before_id is not None else "")
+        pending = [message for message in pending if message_sort_key(message) < cursor]
+    messages = await db.messages.find(
+        query, {"_id": 0}
+    ).sort([("timestamp", -1), ("message_id", -1)]).limit(limit).to_list(limit)
+    # Include messages that haven't been flushed to the database yet
+    stored_ids = {message.get("message_id") for message in messages}
+    messages += [message for message in pending if message["message_id"] not in stored_ids]
+    messages.sort(key=message_sort_key)
+    session["messages"] = messages[-limit:]
+    return APIJSONResponse(with_defaults(InterviewSessionDetail, session))
 
 @api_router.post("/sessions/{session_id}/join")
 async def join_session(session_id: str, user_id: str, role: str):
     # Update session with participant
-    session = await db.interview_sessions.find_one({"session_id": session_id})
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
-    
-    update_data = {}
+    update_pipeline = []
     if role == "candidate":
-        update_data["candidate_id"] = user_id
+        update_pipeline.append({"$set": {"candidate_id": user_id}})
     elif role == "hr":
-        update_data["hr_id"] = user_id
+        update_pipeline.append({"$set": {"hr_id": user_id}})
     
-    # Check if both participants are present
-    if role == "candidate" and session.get("hr_id"):
-        update_data["status"] = "active"
-    elif role == "hr" and session.get("candidate_id"):
-        update_data["status"] = "active"
+    # Activate once both participants are present, judged on the written document
+    # so concurrent joins can't each miss the other
+    update_pipeline.append({"$set": {"status": {"$cond": [
+        {"$and": ["$candidate_id", "$hr_id"]}, "active", "$status"
+    ]}}})
         
-    await db.interview_sessions.update_one(
-        {"session_id": session_id}, 
-        {"$set": update_data}
-    )
-    
-    # Update user's session_id
-    await db.users.update_one(
-        {"user_id": user_id},
-        {"$set": {"session_id": session_id}}
+    # The two writes are independent, so issue them concurrently
+    session, _ = await asyncio.gather(
+        db.interview_sessions.find_one_and_update(
+            {"session_id": session_id},
+            update_pipeline,
+            projection={**PARTICIPANTS_PROJECTION, "status": 1},
+            return_document=ReturnDocument.AFTER,
+        ),
+        # Update user's session_id
+        db.users.update_one(
+            {"user_id": user_id},
+            {"$set": {"session_id": session_id}}
+        ),
     )
+    if not session:
+        # Undo the optimistic user update for a session that doesn't exist
+        await db.users.update_one(
+            {"user_id": user_id, "session_id": session_id},
+            {"$unset": {"session_id": ""}}
+        )
+        raise HTTPException(status_code=404, detail="Session not found")
+    cache_delete(f"user:{user_id}", f"session:{session_id}")
+    manager.set_session_participants(session_id, session.get("candidate_id"), session.get("hr_id"))
     
-    return {"message": "Joined session successfully", "status": update_data.get("status", "waiting")}
+    return {"message": "Joined session successfully", "status": session.get("status", "waiting")}
 
 @api_router.post("/sessions/{session_id}/messages")
 async def send_message(session_id: str, message: Message):
-    # Store message in database
-    message_dict = message.dict()
-    await db.interview_sessions.update_one(
-        {"session_id": session_id},
-        {"$push": {"messages": message_dict}}
-    )
+    if await manager.get_session_participants(session_id) is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    if unwritten_message_count() >= MAX_PENDING_MESSAGES:
+        raise HTTPException(status_code=503, detail="Message storage is unavailable, try again later")
+    
+    # Queue message for the next batched database write
+    message_dict = message.model_dump()
+    message_dict["session_id"] = session_id
+    # Assigned here so a client can't collide with, and silently lose to, an existing id
+    message_dict["message_id"] = new_id()
+    if message_dict["timestamp"].tzinfo is None:
+        message_dict["timestamp"] = message_dict["timestamp"].replace(tzinfo=timezone.utc)
+    message_dict["timestamp"] = to_bson_precision(message_dict["timestamp"])
+    pending_messages[session_id].append(message_dict)
     
     # Send to all participants via WebSocket
     await manager.send_to_session(message_dict, session_id)
@@ -193,25 +461,74 @@ async def send_message(session_id: str, message: Message):
     return {"message": "Message sent successfully"}
 
 # WebSocket endpoint
+async def receive_frame(websocket: WebSocket) -> Union[str, bytes]:
+    # Accept both text and binary frames without re-encoding either
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("text") is not None:
+        return message["text"]
+    return message.get("bytes") or b""
+
+async def forward_frames(forwards: asyncio.Queue):
+    # Deliver a connection's outgoing frames in order, off the receive loop
+    while True:
+        item = await forwards.get()
+        if item is None:
+            return
+        payload, session_id = item
+        try:
+            await manager.forward_raw(payload, session_id)
+        except Exception:
+            logger.exception("Failed to forward message to session %s", session_id)
+
+async def handle_ping(websocket: WebSocket, message_data: dict, data: Union[str, bytes], forwards: asyncio.Queue):
+    await websocket.send_text(PONG)
+
+async def handle_message(websocket: WebSocket, message_data: dict, data: Union[str, bytes], forwards: asyncio.Queue):
+    # Forward the original frame to session participants
+    session_id = message_data.get("session_id")
+    if session_id:
+        await forwards.put((data, session_id))
+
+# WebSocket message type -> handler
+WS_HANDLERS = {
+    "ping": handle_ping,
+    "message": handle_message,
+}
+
 @app.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
     await manager.connect(websocket, user_id)
+    # Bounded so a client sending faster than its session can receive gets backpressure
+    forwards: asyncio.Queue = asyncio.Queue(maxsize=MAX_PENDING_FORWARDS)
+    forwarder = asyncio.create_task(forward_frames(forwards))
     try:
         while True:
-            data = await websocket.receive_text()
-            message_data = json.loads(data)
+            data = await receive_frame(websocket)
+            if len(data) > MAX_FRAME_SIZE:
+                await websocket.close(code=1009)
+                break
+            try:
+                message_data = orjson.loads(data)
+            except orjson.JSONDecodeError:
+                message_data = None
+            if not isinstance(message_data, dict):
+                await websocket.close(code=1003)
+                break
             
             # Handle different message types
-            if message_data.get("type") == "ping":
-                await websocket.send_text(json.dumps({"type": "pong"}))
-            elif message_data.get("type") == "message":
-                # Forward message to session participants
-                session_id = message_data.get("session_id")
-                if session_id:
-                    await manager.send_to_session(message_data, session_id)
+            handler = WS_HANDLERS.get(message_data.get("type"))
+            if handler:
+                await handler(websocket, message_data, data, forwards)
                     
     except WebSocketDisconnect:
-        manager.disconnect(user_id)
+        pass
+    finally:
+        manager.disconnect(user_id, websocket)
+        # Let frames already received from this client reach the session
+        await forwards.put(None)
+        await forwarder
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -231,6 +548,84 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def insert_messages(messages: List[Dict]):
+    try:
+        # Copies keep insert_many from adding _id to the caller's dicts
+        await db.messages.insert_many([dict(message) for message in messages], ordered=False)
+    except BulkWriteError as error:
+        # Messages already written by an interrupted or retried flush are skipped
+        if error.details.get("writeConcernErrors") or any(
+            write_error.get("code") != 11000 for write_error in error.details.get("writeErrors", [])
+        ):
+            raise
+
+async def flush_pending_messages():
+    async with flush_lock:
+        if not pending_messages:
+            return
+        # Keep the batch readable from inflight_messages until the insert has finished
+        inflight_messages.update(pending_messages)
+        pending_messages.clear()
+        try:
+            await insert_messages(
+                [message for batch in inflight_messages.values() for message in batch]
+            )
+        except BaseException:
+            # Also covers cancellation: put the batches back in front of anything
+            # queued meanwhile and retry next time
+            for session_id, batch in inflight_messages.items():
+                pending_messages[session_id][:0] = batch
+            raise
+        finally:
+            inflight_messages.clear()
+
+async def flush_messages_periodically():
+    while True:
+        await asyncio.sleep(MESSAGE_FLUSH_INTERVAL)
+        try:
+            await flush_pending_messages()
+        except Exception:
+            logger.exception("Failed to flush pending messages")
+
+@app.on_event("startup")
+async def create_indexes():
+    await db.users.create_index("user_id", unique=True)
+    await db.interview_sessions.create_index("session_id", unique=True)
+    await db.status_checks.create_index("id", unique=True)
+    await db.messages.create_index([("session_id", 1), ("timestamp", 1), ("message_id", 1)])
+    await db.messages.create_index("message_id", unique=True)
+
+@app.on_event("startup")
+async def migrate_legacy_messages():
+    # Sessions created before messages had their own collection kept them in an array
+    async for session in db.interview_sessions.find(
+        {"messages": {"$exists": True}}, {"_id": 0, "session_id": 1, "messages": 1}
+    ):
+        session_id = session["session_id"]
+        # Deterministic ids let an interrupted migration be re-run without duplicates
+        legacy_messages = [
+            {
+                **message,
+                "session_id": session_id,
+                "message_id": message.get("message_id") or f"legacy-{session_id}-{index}",
+            }
+            for index, message in enumerate(session["messages"])
+        ]
+        if legacy_messages:
+            await insert_messages(legacy_messages)
+        await db.interview_sessions.update_one(
+            {"session_id": session_id}, {"$unset": {"messages": ""}}
+        )
+
+@app.on_event("startup")
+async def start_message_flusher():
+    app.state.message_flusher = asyncio.create_task(flush_messages_periodically())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    # Stop the periodic flusher before the final flush so no batch is abandoned mid-write
+    app.state.message_flusher.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await app.state.message_flusher
+    await flush_pending_messages()
     client.close()
@@ -257,14 +257,14 @@ class BackendTester:
                     
                 self.log_test("Send message", True, "Message sent successfully")
                 
-                # Verify message was stored in session
+                # Verify message is returned with the session's message history
                 response = requests.get(f"{API_BASE}/sessions/{session['session_id']}", timeout=10)
                 if response.status_code == 200:
                     updated_session = response.json()
                     if len(updated_session.get('messages', [])) > 0:
                         stored_message = updated_session['messages'][0]
-                        if stored_message['content'] == message_data['content']:
-                            self.log_test("Message storage", True, "Message correctly stored in session")
+                        if stored_message['content'] == message_data['content'] and stored_message['session_id'] == session['session_id']:
+                            self.log_test("Message storage", True, "Message correctly stored in session history")
                         else:
                             self.log_test("Message storage", False, "Message content mismatch")
                             return False
@@ -274,6 +274,43 @@ class BackendTester:
                 else:
                     self.log_test("Message storage", False, "Could not retrieve updated session")
                     return False
+                
+                # Test message history pagination
+                for content in ["What experience do you have?", "I have five years of experience"]:
+                    time.sleep(0.01)
+                    page_message = dict(message_data, content=content)
+                    response = requests.post(f"{API_BASE}/sessions/{session['session_id']}/messages", 
+                                           json=page_message, timeout=10)
+                    if response.status_code != 200:
+                        self.log_test("Message pagination", False, f"HTTP {response.status_code}: {response.text}")
+                        return False
+                
+                response = requests.get(f"{API_BASE}/sessions/{session['session_id']}", 
+                                      params={"limit": 1}, timeout=10)
+                if response.status_code != 200:
+                    self.log_test("Message pagination limit", False, f"HTTP {response.status_code}: {response.text}")
+                    return False
+                    
+                latest_page = response.json().get('messages', [])
+                if len(latest_page) != 1 or latest_page[0]['content'] != "I have five years of experience":
+                    self.log_test("Message pagination limit", False, f"Expected only the latest message, got {latest_page}")
+                    return False
+                    
+                self.log_test("Message pagination limit", True, "limit=1 returned only the latest message")
+                
+                response = requests.get(f"{API_BASE}/sessions/{session['session_id']}", 
+                                      params={"before": latest_page[0]['timestamp'],
+                                              "before_id": latest_page[0]['message_id']}, timeout=10)
+                if response.status_code != 200:
+                    self.log_test("Message pagination before", False, f"HTTP {response.status_code}: {response.text}")
+                    return False
+                    
+                earlier_page = [message['content'] for message in response.json().get('messages', [])]
+                if earlier_page != [message_data['content'], "What experience do you have?"]:
+                    self.log_test("Message pagination before", False, f"Unexpected earlier page: {earlier_page}")
+                    return False
+                    
+                self.log_test("Message pagination before", True, "before=<ts>&before_id=<id> returned the earlier messages in order")
             
             # Test getting non-existent session
             fake_session_id = str(uuid.uuid4())
@@ -329,7 +366,18 @@ class BackendTester:
                     await websocket.send(json.dumps(test_message))
                     self.log_test("WebSocket message send", True, "Message sent via WebSocket")
                 
-                return True
+            # Test that frames which aren't a JSON object are rejected
+            if not await self.check_websocket_close(ws_url, json.dumps(["not", "an", "object"]), 1003,
+                                                    "WebSocket rejects non-object JSON"):
+                return False
+            
+            # Test that frames over the 64 KiB limit are rejected before parsing
+            oversized_frame = json.dumps({"type": "ping", "padding": "x" * (64 * 1024)})
+            if not await self.check_websocket_close(ws_url, oversized_frame, 1009,
+                                                    "WebSocket rejects oversized frames"):
+                return False
+            
+            return True
                 
         except asyncio.TimeoutError:
             self.log_test("WebSocket connectivity", False, "Connection timeout")
@@ -338,6 +386,25 @@ class BackendTester:
             self.log_test("WebSocket connectivity", False, f"Exception: {str(e)}")
             return False
     
+    async def check_websocket_close(self, ws_url, frame, expected_code, test_name):
+        """Send a frame the server should refuse and check the close code"""
+        async with websockets.connect(ws_url, max_size=None) as websocket:
+            await websocket.send(frame)
+            try:
+                await asyncio.wait_for(websocket.recv(), timeout=5)
+            except websockets.exceptions.ConnectionClosed:
+                pass
+            else:
+                self.log_test(test_name, False, "Connection stayed open")
+                return False
+                
+        if websocket.close_code != expected_code:
+            self.log_test(test_name, False, f"Expected close code {expected_code}, got {websocket.close_code}")
+            return False
+            
+        self.log_test(test_name, True, f"Connection closed with code {expected_code}")
+        return True
+    
     def test_ml_dependencies(self):
         """Test if ML dependencies are properly installed"""
         try: